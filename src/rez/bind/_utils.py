@@ -10,22 +10,60 @@ from rez.util import which
 from rez.utils.execution import Popen
 from rez.utils.logging_ import print_debug
 from rez.vendor.six import six
-from pipes import quote
+from rez.vendor.six.six.moves import shlex_quote
+from rez.backport.lru_cache import lru_cache
+from rez.vendor.atomicwrites import atomic_write
 import subprocess
 import os.path
 import os
+import stat
 import platform
+import tempfile
+import atexit
+import hashlib
+import json
 import sys
+import re
+import threading
+import signal
+import time
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # py2 without the 'futures' backport
+    ThreadPoolExecutor = None
 
 
 basestring = six.string_types[0]
 
+_is_windows = ("Windows" in platform.system())
+
+# seconds given to a process to exit by itself once _run_command has read
+# enough of its output
+_line_limit_grace = 0.5
+
+# separators between version tokens in a program's version output
+_version_split_regex = re.compile(r"[.\-]+")
+
 
 def log(msg):
-    if config.debug("bind_modules"):
+    if _debug_enabled():
         print_debug(msg)
 
 
+# config data the debug setting was read from, and the setting's value
+_debug_state = [None, False]
+
+
+def _debug_enabled():
+    # Config replaces its data whenever it is overridden or swapped (see
+    # `Config._uncache`), so the setting is only read again when that happens.
+    data = config._data
+    if data is not _debug_state[0]:
+        _debug_state[:] = [data, config.debug("bind_modules")]
+    return _debug_state[1]
+
+
 def make_dirs(*dirs):
     path = os.path.join(*dirs)
     if not os.path.exists(path):
@@ -33,10 +71,168 @@ def make_dirs(*dirs):
     return path
 
 
+# Script run by `_PyWorker`. Reads one json encoded python command per line
+# from stdin, runs it, and writes back a json encoded
+# [stdout, stderr, returncode] line. The protocol uses duplicates of fds 0 and
+# 1, while the fds themselves are redirected: commands read stdin from devnull,
+# and their output is captured at the fd level, so that output from
+# subprocesses or C code can't end up in the replies.
+_py_worker_script = r"""
+import json, os, sys, tempfile, traceback
+loads, dumps = json.loads, json.dumps
+stdin, reply = os.fdopen(os.dup(0), "r"), os.fdopen(os.dup(1), "w")
+out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+devnull = os.open(os.devnull, os.O_RDWR)
+path, argv = list(sys.path), list(sys.argv)
+
+def read_output(f):
+    f.seek(0)
+    data = f.read().decode("utf-8", "replace")
+    f.seek(0)
+    f.truncate()
+    return data
+
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+while True:
+    line = stdin.readline()
+    if not line:
+        break
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    returncode = 0
+    try:
+        exec(loads(line), {"__name__": "__main__"})
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            returncode = e.code
+        elif e.code is not None:
+            sys.stderr.write("%s\n" % e.code)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    sys.stdin, sys.stdout, sys.stderr = sys.__stdin__, sys.__stdout__, sys.__stderr__
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    sys.path[:], sys.argv[:] = path, argv
+    reply.write(dumps([read_output(out), read_output(err), returncode]) + "\n")
+    reply.flush()
+"""
+
+
+class _PyWorker(object):
+    """A long-lived python interpreter used by `run_python_command`.
+
+    Bind modules may run many small python commands, spawning a new
+    interpreter for each of them is far more expensive than the commands
+    themselves. The worker is started on first use and closed at exit. If it
+    can't be started it is disabled, and `run_python_command` falls back to
+    one process per command.
+
+    Commands are run one at a time, even if called from several threads.
+
+    Note that commands are not fully isolated from each other. Each one gets
+    its own globals, and sys.path and sys.argv are restored after it, but the
+    modules it imports (and any changes it makes to them) stay loaded for the
+    commands that follow.
+    """
+    def __init__(self):
+        self.proc = None
+        self.disabled = False
+        self.lock = threading.Lock()
+
+    def run(self, py_cmd):
+        """Run a python command in the worker.
+
+        Returns:
+            3-tuple of stdout, stderr and returncode, or None if the worker
+            is not usable and the command was not run.
+        """
+        with self.lock:
+            if self.disabled:
+                return None
+
+            try:
+                if self.proc is None:
+                    self._start()
+
+                self.proc.stdin.write(json.dumps(py_cmd) + "\n")
+                self.proc.stdin.flush()
+            except (OSError, IOError, ValueError):
+                self._disable()
+                return None
+            except BaseException:
+                # eg KeyboardInterrupt, a partly sent command can't be recovered
+                self._disable()
+                raise
+
+            # The command may have run by now, so it must not be run again
+            # elsewhere. Failures from here on are reported as its result.
+            try:
+                stdout, stderr, returncode = json.loads(self.proc.stdout.readline())
+            except (OSError, IOError, ValueError, TypeError):
+                self._disable()
+                return "", "python worker exited unexpectedly", 1
+            except BaseException:
+                # eg KeyboardInterrupt, the reply would be left in the pipe
+                # and read by the next command
+                self._disable()
+                raise
+
+        if six.PY2:
+            stdout, stderr = stdout.encode("utf-8"), stderr.encode("utf-8")
+        return stdout, stderr, returncode
+
+    def close(self):
+        if self.proc is None:
+            return
+
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+            proc.wait()
+        except (OSError, IOError):
+            pass
+        proc.stdout.close()
+
+    def _disable(self):
+        self.disabled = True
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+        self.close()
+
+    def _start(self):
+        log("starting python worker: %s" % sys.executable)
+        with open(os.devnull, 'w') as devnull:
+            self.proc = Popen(
+                [sys.executable, "-u", "-c", _py_worker_script],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=devnull,
+                text=True
+            )
+        atexit.register(self.close)
+
+
+_py_worker = _PyWorker()
+
+
 def run_python_command(commands, exe=None):
     py_cmd = "; ".join(commands)
-    args = [exe or sys.executable, "-c", py_cmd]
-    stdout, stderr, returncode = _run_command(args)
+    result = None
+
+    if not exe:
+        log("running in python worker: %s" % py_cmd)
+        result = _py_worker.run(py_cmd)
+
+    if result is None:
+        args = [exe or sys.executable, "-c", py_cmd]
+        result = _run_command(args)
+
+    stdout, stderr, returncode = result
     return (returncode == 0), stdout.strip(), stderr.strip()
 
 
@@ -72,21 +268,36 @@ def find_exe(name, filepath=None):
         Path to the executable if found, otherwise an error is raised.
     """
     if filepath:
-        if not os.path.exists(filepath):
-            with open(filepath):
-                pass  # raise IOError
-        elif not os.path.isfile(filepath):
-            raise RezBindError("not a file: %s" % filepath)
+        try:
+            st = os.stat(filepath)
+        except OSError as e:
+            raise IOError(e.errno, e.strerror, filepath)
+        else:
+            if not stat.S_ISREG(st.st_mode):
+                raise RezBindError("not a file: %s" % filepath)
     else:
-        filepath = which(name)
+        filepath = _which_cached(name, os.environ.get("PATH", ""))
         if not filepath:
             raise RezBindError("could not find executable: %s" % name)
 
     return filepath
 
 
+@lru_cache(maxsize=256)
+def _which_cached(name, path):
+    """Memoized `which`. `path` is the current PATH, it is only used as part
+    of the cache key so that lookups stay correct if PATH is changed. Call
+    `_which_cached.cache_clear()` to drop stale results.
+    """
+    return which(name)
+
+
 def extract_version(exepath, version_arg, line_index=0, word_index=-1, version_rank=3):
-    """Run an executable and get the program version.
+    """Get the program version of an executable.
+
+    If the executable's checksum is listed in the bind_version_checksums
+    setting, the listed version is returned without running it. Otherwise the
+    executable is run, and the version is read from its output.
 
     Args:
         exepath: Filepath to executable.
@@ -98,11 +309,25 @@ def extract_version(exepath, version_arg, line_index=0, word_index=-1, version_r
     Returns:
         `Version` object.
     """
+    strver = _get_checksum_version(exepath)
+    if strver:
+        log("Extracting version from checksum: '%s'" % strver)
+        try:
+            version = Version(strver)
+        except Exception as e:
+            raise RezBindError("Failed to parse version '%s' from bind_version_checksums: %s"
+                               % (strver, str(e)))
+        log("Extracted version: '%s'" % str(version))
+        return version
+
     if isinstance(version_arg, basestring):
         version_arg = [version_arg]
     args = [exepath] + version_arg
 
-    stdout, stderr, returncode = _run_command(args)
+    # only read as far as the line holding the version
+    line_limit = (line_index + 1) if line_index >= 0 else None
+
+    stdout, stderr, returncode = _run_command(args, line_limit=line_limit)
     if returncode:
         raise RezBindError("Failed to execute %s: %s\n(error code %d)"
                            % (exepath, stderr, returncode))
@@ -112,9 +337,7 @@ def extract_version(exepath, version_arg, line_index=0, word_index=-1, version_r
 
     try:
         strver = stdout.split()[word_index]
-        toks = strver.replace('.', ' ').replace('-', ' ').split()
-        strver = '.'.join(toks[:version_rank])
-        version = Version(strver)
+        version = _make_version(strver, version_rank)
     except Exception as e:
         raise RezBindError("Failed to parse version from output '%s': %s"
                            % (stdout, str(e)))
@@ -123,23 +346,231 @@ def extract_version(exepath, version_arg, line_index=0, word_index=-1, version_r
     return version
 
 
-def _run_command(args):
-    cmd_str = ' '.join(quote(x) for x in args)
-    log("running: %s" % cmd_str)
+def get_running_python_version(exepath, version_rank=3):
+    """Get the version of a python executable without running it.
+
+    This only works if the executable is the interpreter rez itself is
+    running in, the version is then known in-process.
+
+    Args:
+        exepath: Filepath to python executable.
+        version_rank: Cap the version to this many tokens.
+
+    Returns:
+        `Version` object, or None if exepath is another executable.
+    """
+    try:
+        if not os.path.samefile(exepath, sys.executable):
+            return None
+    except (AttributeError, OSError):  # no samefile in py2 on windows
+        return None
+
+    version = _make_version('.'.join(str(x) for x in sys.version_info), version_rank)
+    log("Extracted version of running python: '%s'" % str(version))
+    return version
+
+
+def _make_version(strver, version_rank):
+    strver = strver.strip('.-')
+    if isinstance(version_rank, int) and version_rank > 0:
+        # no need to split further than the tokens we keep
+        toks = _version_split_regex.split(strver, version_rank)
+    else:
+        toks = _version_split_regex.split(strver)
+    return Version('.'.join(toks[:version_rank]))
+
+
+# Checksums of executables hashed so far, see `_get_exe_sha256`. Maps each
+# bind_version_checksums_cache file used (None if none) to a dict of
+# realpath -> [mtime, size, sha256], loaded from that file on first use.
+_exe_checksums = {}
+_exe_checksums_lock = threading.Lock()
+
+
+def _get_checksum_version(exepath):
+    """Look up an executable's version in the bind_version_checksums setting.
+
+    Returns:
+        The version string, or None if the executable is not listed.
+    """
+    checksums = config.bind_version_checksums
+    if not checksums:
+        return None
+
+    try:
+        sha256 = _get_exe_sha256(exepath)
+    except (IOError, OSError) as e:
+        log("Failed to compute checksum of %s: %s" % (exepath, str(e)))
+        return None
+
+    return checksums.get(sha256)
+
+
+def _get_exe_sha256(exepath):
+    """Get the SHA-256 checksum of an executable.
+
+    Checksums are cached per file, and only computed again if the file's
+    modification time or size changes.
+    """
+    cache_file = config.bind_version_checksums_cache
+    if cache_file:
+        cache_file = os.path.expanduser(cache_file)
+    else:
+        cache_file = None
+
+    realpath = os.path.realpath(exepath)
+    st = os.stat(realpath)
+
+    with _exe_checksums_lock:
+        checksums = _exe_checksums.get(cache_file)
+        if checksums is None:
+            checksums = _load_exe_checksums(cache_file)
+            _exe_checksums[cache_file] = checksums
+
+        entry = checksums.get(realpath)
+        if (isinstance(entry, list) and len(entry) == 3
+                and entry[:2] == [st.st_mtime, st.st_size]
+                and isinstance(entry[2], six.string_types)):
+            return entry[2]
+
+    h = hashlib.sha256()
+    with open(realpath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    sha256 = h.hexdigest()
+
+    with _exe_checksums_lock:
+        checksums[realpath] = [st.st_mtime, st.st_size, sha256]
+
+        if cache_file:
+            # written atomically, other rez-bind processes may read it meanwhile
+            try:
+                with atomic_write(cache_file, overwrite=True) as f:
+                    json.dump(checksums, f)
+            except (IOError, OSError) as e:
+                log("Failed to write checksums cache %s: %s" % (cache_file, str(e)))
+
+    return sha256
 
-    # https://github.com/nerdvegas/rez/pull/659
-    use_shell = ("Windows" in platform.system())
 
-    p = Popen(
-        args,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=use_shell,
-        text=True
-    )
+def _load_exe_checksums(cache_file):
+    if not cache_file or not os.path.isfile(cache_file):
+        return {}
 
-    stdout, stderr = p.communicate()
-    return stdout, stderr, p.returncode
+    try:
+        with open(cache_file) as f:
+            checksums = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        log("Ignoring unreadable checksums cache %s: %s" % (cache_file, str(e)))
+        return {}
+
+    if not isinstance(checksums, dict):
+        log("Ignoring invalid checksums cache %s" % cache_file)
+        return {}
+
+    return checksums
+
+
+def _run_command(args, line_limit=None):
+    """Run a command and capture its output.
+
+    Args:
+        args: Command to run.
+        line_limit: If set, stop reading stdout after this many lines (leading
+            blank lines are not counted) and kill the process.
+
+    Returns:
+        3-tuple of stdout, stderr and returncode.
+    """
+    if _debug_enabled():
+        print_debug("running: %s" % ' '.join([shlex_quote(x) for x in args]))
+
+    kwargs = {}
+    if _is_windows:
+        # https://github.com/nerdvegas/rez/pull/659
+        # Only go through cmd.exe when the exe still has to be resolved, full
+        # paths (as returned by find_exe) are run directly.
+        kwargs["shell"] = not os.path.isabs(args[0])
+    elif sys.version_info[:2] >= (3, 8):
+        # Fds are not inheritable by default (PEP 446), and not closing them
+        # lets py3.8+ spawn the child with posix_spawn rather than fork/exec.
+        # Older pythons keep closing fds, on py2 they would all be inherited.
+        kwargs["close_fds"] = False
+
+    if line_limit is None:
+        p = Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            **kwargs
+        )
+
+        stdout, stderr = p.communicate()
+        return stdout, stderr, p.returncode
+
+    # stderr goes to a file rather than a pipe, so that a chatty stderr can't
+    # block the process while we are reading stdout.
+    lines = []
+    killed = False
+
+    with tempfile.TemporaryFile(mode="w+") as errfile:
+        p = Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=errfile,
+            text=True,
+            **kwargs
+        )
+
+        # The Popen wrapper gives the process a stdin pipe when our own stdin
+        # isn't usable (eg in maya). Close it as communicate() would, so that
+        # a process reading stdin doesn't block.
+        if p.stdin:
+            p.stdin.close()
+
+        for line in iter(p.stdout.readline, ''):
+            if lines or line.strip():
+                lines.append(line)
+                if len(lines) >= line_limit:
+                    break
+
+        # We have what we need. Give the process a moment to exit by itself,
+        # so that a real exit code isn't hidden, then stop it. Its remaining
+        # output is drained meanwhile, so that it isn't blocked writing to a
+        # full pipe.
+        if len(lines) >= line_limit:
+            drain = threading.Thread(target=_drain, args=(p.stdout,))
+            drain.daemon = True
+            drain.start()
+
+            deadline = time.time() + _line_limit_grace
+            while p.poll() is None and time.time() < deadline:
+                time.sleep(0.005)
+
+            if p.poll() is None:
+                p.kill()
+                killed = True
+            drain.join()
+
+        p.stdout.close()
+        p.wait()
+
+        errfile.seek(0)
+        stderr = errfile.read()
+
+    # only a process that died from our own kill counts as succeeded
+    returncode = p.returncode
+    if killed and (_is_windows or returncode == -signal.SIGKILL):
+        returncode = 0
+
+    return ''.join(lines), stderr, returncode
+
+
+def _drain(f):
+    """Read and discard the rest of a file's content."""
+    while f.read(65536):
+        pass
 
 
 def get_implicit_system_variant():
@@ -165,14 +596,16 @@ def get_implicit_system_variant():
     An implicit package looks like: ~platform==windows
     The system variant string usually looks like: ['platform-windows', 'arch-AMD64', 'os-windows-10.0.18362.SP0']
     """
-    implicit_packages = [var.split('==')[0][1:] for var in config.implicit_packages]
-    variants = [var for var in system.variant if var.split('-')[0] in implicit_packages]
+    return list(_get_implicit_system_variant(tuple(config.implicit_packages)))
 
-    return variants
-    pass
 
+@lru_cache(maxsize=8)
+def _get_implicit_system_variant(implicit_packages):
+    implicit_names = {var.split('==')[0][1:] for var in implicit_packages}
+    return tuple([var for var in system.variant if var.split('-', 1)[0] in implicit_names])
 
-def get_app_folders_vers(appname, install_root='/opt', test_folder=None):
+
+def get_app_folders_vers(appname, install_root='/opt', test_folder=None, parallel=False):
     """
     This is the basis for folders versions bindin mechanism.
     This assume the next:
@@ -203,27 +636,59 @@ def get_app_folders_vers(appname, install_root='/opt', test_folder=None):
         install_root: base install location, under it there must be a folder with  the same name as the app and inside the different verions folder.
         test_folder: function implemented by the user in the bind module for the app. 
             Just do some test to check whether or not the folder is an install of the tool. Return Tru or False
+        parallel: if True, test_folder is called on the version folders from several threads at once, which
+            speeds up I/O bound checks on big install roots or network filesystems. test_folder must then be
+            thread-safe.
 
     Returns:
         List of folders with versions of the tool.
     """
     baseappinstall = os.path.normpath(os.path.join(install_root, appname))
-    if not os.path.exists(baseappinstall) or not os.path.isdir(baseappinstall):
+    try:
+        is_dir = stat.S_ISDIR(os.stat(baseappinstall).st_mode)
+    except OSError:
+        is_dir = False
+    if not is_dir:
         raise RezBindError(
             "%s base install path doesn't exists or is not a directory: %s" % (appname, baseappinstall))
+    if test_folder is None:
+        return list(_iter_subdirs(baseappinstall))
+
     # Check if the passed path is already the app folder, so there are not folders with version, this is the actual folder for the app
-    if test_folder is not None and test_folder(baseappinstall):
+    if test_folder(baseappinstall):
         return [baseappinstall]
-    versdirs = [os.path.normpath(os.path.join(baseappinstall, lsfile)) for lsfile in os.listdir(
-        baseappinstall) if os.path.isdir(os.path.join(baseappinstall, lsfile))]
-    # versdirs = os.listdir(baseappinstall)
-    if test_folder is not None:
-        # Call to filter function
+
+    # Call to filter function
+    if parallel and ThreadPoolExecutor is not None:
+        versdirs = list(_iter_subdirs(baseappinstall))
+        if len(versdirs) > 4:
+            with ThreadPoolExecutor(max_workers=min(32, len(versdirs))) as executor:
+                valids = list(executor.map(test_folder, versdirs))
+            return [validdir for validdir, valid in zip(versdirs, valids) if valid]
         return [validdir for validdir in versdirs if test_folder(validdir)]
-    else:
-        return versdirs
 
-    pass
+    # filter while scanning, so only valid folders are collected
+    return [validdir for validdir in _iter_subdirs(baseappinstall) if test_folder(validdir)]
+
+
+def _iter_subdirs(path):
+    """
+    Yield the paths of the directories found directly under path.
+    Uses os.scandir where available, so the entry type cached by the directory read is
+    reused instead of stat'ing every child again.
+    path must already be normalised, then the children paths are normalised as well.
+    """
+    if hasattr(os, "scandir"):
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    yield entry.path
+    else:  # py2
+        prefix = os.path.join(path, '')
+        for name in os.listdir(path):
+            subpath = prefix + name
+            if os.path.isdir(subpath):
+                yield subpath
 
 
 def use_folders_vers(arg):
@@ -239,7 +704,7 @@ def use_folders_vers(arg):
     Returns:
         True if use folders versions should be used.
     """
-    return arg is not None or (hasattr( config, 'bind_use_folders_vers') and config.bind_use_folders_vers)
+    return arg is not None or getattr(config, 'bind_use_folders_vers', False)
 
 def get_use_folders_vers_root(arg):
     """
@@ -251,10 +716,11 @@ def get_use_folders_vers_root(arg):
         arg: result of opt.use_folders_vers in the bind module. Option passed as an argument.
     """
     root_install = arg
-    if ( root_install is None or not root_install ) and (hasattr(config, 'bind_use_folders_vers') and config.bind_use_folders_vers):
-        if( hasattr(config, 'bind_use_folders_vers_root') and config.bind_use_folders_vers_root and config.bind_use_folders_vers_root.strip() ):
+    if not root_install and getattr(config, 'bind_use_folders_vers', False):
+        config_root = getattr(config, 'bind_use_folders_vers_root', None)
+        if config_root and config_root.strip():
             # root folder specified in rezconfig
-            root_install = config.bind_use_folders_vers_root
+            root_install = config_root
         else:
             # If there neither the path has been passednor it has been spcified in rezconfig then fallback to the defaul /opt .
             root_install = '/opt'
@@ -278,10 +744,11 @@ def get_install_path(install_path, pkgtype=None):
     """
     if install_path == config.release_packages_path:
         if pkgtype is not None:
-            if hasattr(config, 'release_packages_root') and config.release_packages_root:
-                if hasattr(config, 'release_packages_types') and len(config.release_packages_types) > 0:
-                    if pkgtype in config.release_packages_types:
-                        install_path = os.path.normpath(os.path.join(config.release_packages_root, pkgtype))
+            release_root = getattr(config, 'release_packages_root', None)
+            if release_root:
+                release_types = getattr(config, 'release_packages_types', None)
+                if release_types and pkgtype in release_types:
+                    install_path = os.path.normpath(os.path.join(release_root, pkgtype))
 
     return install_path
 
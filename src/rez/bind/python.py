@@ -3,7 +3,7 @@ Binds a python executable as a rez package.
 """
 from __future__ import absolute_import
 from rez.bind._utils import check_version, find_exe, extract_version, \
-    make_dirs, log, run_python_command
+    get_running_python_version, make_dirs, log, run_python_command
 from rez.package_maker import make_package
 from rez.system import system
 from rez.utils.lint_helper import env
@@ -37,8 +37,10 @@ def post_commands():
 def bind(path, version_range=None, opts=None, parser=None):
     # find executable, determine version
     exepath = find_exe("python", opts.exe)
-    code = "import sys; print('.'.join(str(x) for x in sys.version_info))"
-    version = extract_version(exepath, ["-c", code])
+    version = get_running_python_version(exepath)
+    if version is None:
+        code = "import sys; print('.'.join(str(x) for x in sys.version_info))"
+        version = extract_version(exepath, ["-c", code])
 
     check_version(version, version_range)
     log("binding python: %s" % exepath)
@@ -329,6 +329,8 @@ config_schema = Schema({
     "bind_use_folders_vers_root":                   OptionalStr,
     "bind_quickstart_tools":                        OptionalStrList,
     "bind_apps_tools":                              OptionalStrList,
+    "bind_version_checksums":                       OptionalDict,
+    "bind_version_checksums_cache":                 OptionalStr,
     "standard_system_paths":                        PathList,
     "package_definition_build_python_paths":        PathList,
     "platform_map":                                 OptionalDict,
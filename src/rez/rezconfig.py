@@ -203,6 +203,21 @@ bind_quickstart_tools = []
 # "nuke"]
 bind_apps_tools = []
 
+# Known versions of executables, keyed by the SHA-256 checksum of the executable.
+# When a bind module extracts the version of an executable listed here, the version is
+# taken from this table rather than running the executable.
+# Example:
+#
+#     bind_version_checksums = {
+#         "0f6bd3e1...": "3.7.7"
+#     }
+bind_version_checksums = {}
+
+# File used to cache the checksums computed for bind_version_checksums, so that executables
+# are only hashed again when they change (based on modification time and size).
+# Left blank to disable the cache.
+bind_version_checksums_cache = ""
+
 ###############################################################################
 # Caching
 ###############################################################################
@@ -0,0 +1,381 @@
+"""
+unit tests for 'bind._utils' module
+"""
+import os
+import json
+import hashlib
+import shutil
+import unittest
+import tempfile
+import threading
+import time
+import sys
+from rez.tests.util import TestBase
+from rez.bind import _utils
+from rez.config import config
+from rez.exceptions import RezBindError
+from rez.vendor.version.version import Version
+
+
+class TestDebug(TestBase):
+    def test_config_override(self):
+        """Test that debug logging follows config changes."""
+        self.update_settings({"quiet": False, "debug_bind_modules": False})
+        self.assertFalse(_utils._debug_enabled())
+
+        self.update_settings({"quiet": False, "debug_bind_modules": True})
+        self.assertTrue(_utils._debug_enabled())
+
+        config.override("quiet", True)
+        self.assertFalse(_utils._debug_enabled())
+
+        config.remove_override("quiet")
+        self.assertTrue(_utils._debug_enabled())
+
+
+class TestPythonWorker(TestBase):
+    def setUp(self):
+        super(TestPythonWorker, self).setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix="rez_selftest_")
+
+        # use a private worker, so tests don't share interpreter state
+        self._global_worker = _utils._py_worker
+        self.worker = _utils._PyWorker()
+        _utils._py_worker = self.worker
+
+    def tearDown(self):
+        self.worker.close()
+        _utils._py_worker = self._global_worker
+        shutil.rmtree(self.tmpdir)
+        super(TestPythonWorker, self).tearDown()
+
+    def test_stdout(self):
+        """Test capture of a command's output."""
+        success, out, err = _utils.run_python_command(
+            ["import sys", "print('hello')", "sys.stderr.write('world')"])
+        self.assertTrue(success)
+        self.assertEqual(out, "hello")
+        self.assertEqual(err, "world")
+        self.assertFalse(self.worker.disabled)
+
+    def test_fd_output(self):
+        """Test that output written directly to fd 1 is captured."""
+        success, out, _ = _utils.run_python_command(
+            ["import os", "os.write(1, b'hello\\n')"])
+        self.assertTrue(success)
+        self.assertEqual(out, "hello")
+
+        success, out, _ = _utils.run_python_command(["print('again')"])
+        self.assertEqual(out, "again")
+        self.assertFalse(self.worker.disabled)
+
+    def test_stdin(self):
+        """Test that commands reading stdin don't block or break the worker."""
+        success, out, _ = _utils.run_python_command(
+            ["import sys", "print(repr(sys.stdin.readline()))"])
+        self.assertTrue(success)
+        self.assertEqual(out, repr(""))
+
+        success, out, _ = _utils.run_python_command(
+            ["import os", "print(repr(os.read(0, 10)))"])
+        self.assertTrue(success)
+        self.assertEqual(out, repr(b""))
+
+        success, out, _ = _utils.run_python_command(["print('next')"])
+        self.assertEqual(out, "next")
+
+    def test_interrupted(self):
+        """Test that an interrupted command disables the worker."""
+        class _InterruptedPipe(object):
+            def readline(self):
+                raise KeyboardInterrupt
+
+            def close(self):
+                pass
+
+        _utils.run_python_command(["pass"])
+        proc = self.worker.proc
+        stdout, proc.stdout = proc.stdout, _InterruptedPipe()
+
+        self.assertRaises(KeyboardInterrupt, _utils.run_python_command,
+                          ["print('hello')"])
+        self.assertTrue(self.worker.disabled)
+        self.assertIsNone(self.worker.proc)
+        stdout.close()
+
+    def test_exit_code(self):
+        """Test that sys.exit sets the return code."""
+        success, _, _ = _utils.run_python_command(["import sys", "sys.exit(0)"])
+        self.assertTrue(success)
+
+        success, _, err = _utils.run_python_command(["import sys", "sys.exit(3)"])
+        self.assertFalse(success)
+
+        success, _, err = _utils.run_python_command(
+            ["import sys", "sys.exit('failed')"])
+        self.assertFalse(success)
+        self.assertEqual(err, "failed")
+
+    def test_exception(self):
+        """Test that an exception fails the command."""
+        success, _, err = _utils.run_python_command(
+            ["import rez_no_such_module"])
+        self.assertFalse(success)
+        self.assertIn("rez_no_such_module", err)
+        self.assertFalse(self.worker.disabled)
+
+    def test_state(self):
+        """Test that commands can't break the worker for later commands."""
+        _utils.run_python_command(
+            ["import json, sys", "json.loads = None", "sys.path[:] = []"])
+
+        success, out, _ = _utils.run_python_command(
+            ["import sys", "print(len(sys.path) > 0)"])
+        self.assertTrue(success)
+        self.assertEqual(out, "True")
+        self.assertFalse(self.worker.disabled)
+
+    def test_threads(self):
+        """Test commands run from several threads at once."""
+        results = {}
+
+        def run(i):
+            results[i] = _utils.run_python_command(["print(%d)" % i])
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, dict((i, (True, str(i), "")) for i in range(20)))
+        self.assertFalse(self.worker.disabled)
+
+    def test_fallback(self):
+        """Test fallback to a new process when the worker is broken."""
+        _utils.run_python_command(["pass"])
+        self.worker.proc.kill()
+        self.worker.proc.wait()
+
+        success, out, _ = _utils.run_python_command(["print('hello')"])
+        self.assertTrue(success)
+        self.assertEqual(out, "hello")
+        self.assertTrue(self.worker.disabled)
+
+    def test_no_rerun(self):
+        """Test that a command that kills the worker is not run again."""
+        filepath = os.path.join(self.tmpdir, "count")
+        success, _, _ = _utils.run_python_command(
+            ["import os",
+             "open(%r, 'a').write('x')" % filepath,
+             "os._exit(0)"])
+        self.assertFalse(success)
+        self.assertTrue(self.worker.disabled)
+
+        with open(filepath) as f:
+            self.assertEqual(f.read(), "x")
+
+
+class TestExtractVersion(TestBase):
+    def test_version_rank(self):
+        """Test capping versions to a number of tokens."""
+        strvers = ["1.2.3.4", "2.7-rc1", "-1..2.3-", "10", "1.2.3-beta.5"]
+        for strver in strvers:
+            for version_rank in (None, -2, 0, 1, 3, 5):
+                toks = strver.replace('.', ' ').replace('-', ' ').split()
+                expected = Version('.'.join(toks[:version_rank]))
+                version = _utils._make_version(strver, version_rank)
+                self.assertEqual(version, expected)
+
+    def test_line_limit(self):
+        """Test reading the version without waiting for the program to end."""
+        code = "print('\\nfoo 1.2.3'); import time; time.sleep(30)"
+        start = time.time()
+        version = _utils.extract_version(sys.executable, ["-c", code])
+        self.assertEqual(version, Version("1.2.3"))
+        self.assertLess(time.time() - start, 10)
+
+    def test_line_limit_verbose(self):
+        """Test that a program with a lot of output isn't left blocked."""
+        code = "print('foo 1.2.3'); import sys; sys.stdout.write('x' * 1000000)"
+        grace = _utils._line_limit_grace
+        _utils._line_limit_grace = 30
+        try:
+            start = time.time()
+            version = _utils.extract_version(sys.executable, ["-c", code])
+        finally:
+            _utils._line_limit_grace = grace
+
+        self.assertEqual(version, Version("1.2.3"))
+        self.assertLess(time.time() - start, 10)
+
+    def test_running_python(self):
+        """Test getting the running python's version in-process."""
+        code = "import sys; print('.'.join(str(x) for x in sys.version_info))"
+        expected = _utils.extract_version(sys.executable, ["-c", code])
+        self.assertEqual(_utils.get_running_python_version(sys.executable), expected)
+
+        tmpdir = tempfile.mkdtemp(prefix="rez_selftest_")
+        try:
+            exepath = os.path.join(tmpdir, "python")
+            with open(exepath, 'w'):
+                pass
+            self.assertIsNone(_utils.get_running_python_version(exepath))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_failed(self):
+        """Test that a failing program is an error, even if it printed a version."""
+        code = "print('foo 1.2.3'); import sys; sys.exit(4)"
+        self.assertRaises(RezBindError, _utils.extract_version,
+                          sys.executable, ["-c", code])
+
+
+class TestVersionChecksums(TestBase):
+    def setUp(self):
+        super(TestVersionChecksums, self).setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix="rez_selftest_")
+        self.cache_file = os.path.join(self.tmpdir, "checksums.json")
+        _utils._exe_checksums.clear()
+
+        # not executable, so any attempt to run it fails
+        self.exepath = os.path.join(self.tmpdir, "tool")
+        with open(self.exepath, 'w') as f:
+            f.write("not a real executable")
+
+    def tearDown(self):
+        _utils._exe_checksums.clear()
+        shutil.rmtree(self.tmpdir)
+        super(TestVersionChecksums, self).tearDown()
+
+    def _sha256(self):
+        with open(self.exepath, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def test_listed(self):
+        """Test that a listed checksum gives the version without running."""
+        self.update_settings({
+            "bind_version_checksums": {self._sha256(): "4.5.6"}
+        })
+        version = _utils.extract_version(self.exepath, "--version")
+        self.assertEqual(version, Version("4.5.6"))
+
+    def test_cache(self):
+        """Test that cached checksums are used until the file changes."""
+        self.update_settings({
+            "bind_version_checksums": {"0" * 64: "1.0"},
+            "bind_version_checksums_cache": self.cache_file
+        })
+
+        # a cache entry matching the file's mtime and size is trusted
+        _utils._get_exe_sha256(self.exepath)
+        with open(self.cache_file) as f:
+            checksums = json.load(f)
+        entry = checksums[os.path.realpath(self.exepath)]
+        self.assertEqual(entry[2], self._sha256())
+
+        entry[2] = "0" * 64
+        with open(self.cache_file, 'w') as f:
+            json.dump(checksums, f)
+
+        _utils._exe_checksums.clear()
+        version = _utils.extract_version(self.exepath, "--version")
+        self.assertEqual(version, Version("1.0"))
+
+        # once the file changes it is hashed again
+        with open(self.exepath, 'a') as f:
+            f.write("more")
+        self.assertEqual(_utils._get_exe_sha256(self.exepath), self._sha256())
+
+
+    def test_invalid_cache(self):
+        """Test that an invalid cache file is ignored."""
+        self.update_settings({
+            "bind_version_checksums": {self._sha256(): "4.5.6"},
+            "bind_version_checksums_cache": self.cache_file
+        })
+
+        for content in ("[]", '{"%s": 5}' % os.path.realpath(self.exepath)):
+            with open(self.cache_file, 'w') as f:
+                f.write(content)
+
+            _utils._exe_checksums.clear()
+            version = _utils.extract_version(self.exepath, "--version")
+            self.assertEqual(version, Version("4.5.6"))
+
+    def test_cache_files(self):
+        """Test that each cache file has its own checksums."""
+        other_cache_file = os.path.join(self.tmpdir, "other.json")
+        self.update_settings({
+            "bind_version_checksums": {"0" * 64: "1.0"},
+            "bind_version_checksums_cache": self.cache_file
+        })
+        _utils._get_exe_sha256(self.exepath)
+
+        with open(other_cache_file, 'w') as f:
+            st = os.stat(self.exepath)
+            json.dump({os.path.realpath(self.exepath):
+                       [st.st_mtime, st.st_size, "0" * 64]}, f)
+
+        self.update_settings({
+            "bind_version_checksums": {"0" * 64: "1.0"},
+            "bind_version_checksums_cache": other_cache_file
+        })
+        version = _utils.extract_version(self.exepath, "--version")
+        self.assertEqual(version, Version("1.0"))
+
+
+class TestAppFoldersVers(TestBase):
+    def setUp(self):
+        super(TestAppFoldersVers, self).setUp()
+        self.tmpdir = tempfile.mkdtemp(prefix="rez_selftest_")
+        self.appdir = os.path.join(self.tmpdir, "app")
+
+        self.names = ["v%02d" % i for i in range(10)]
+        for name in self.names:
+            os.makedirs(os.path.join(self.appdir, name))
+        with open(os.path.join(self.appdir, "notadir"), 'w'):
+            pass
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(TestAppFoldersVers, self).tearDown()
+
+    def _test_folder(self, path):
+        name = os.path.basename(path)
+        return name in self.names and int(name[1:]) % 2 == 0
+
+    def test_no_test_folder(self):
+        """Test listing all version folders."""
+        folders = _utils.get_app_folders_vers("app", self.tmpdir)
+        expected = [os.path.join(self.appdir, x) for x in self.names]
+        self.assertEqual(sorted(folders), expected)
+
+    def test_test_folder(self):
+        """Test filtering version folders, sequentially and in parallel."""
+        expected = sorted(os.path.join(self.appdir, x) for x in self.names[::2])
+
+        folders = _utils.get_app_folders_vers(
+            "app", self.tmpdir, test_folder=self._test_folder)
+        self.assertEqual(sorted(folders), expected)
+
+        folders = _utils.get_app_folders_vers(
+            "app", self.tmpdir, test_folder=self._test_folder, parallel=True)
+        self.assertEqual(sorted(folders), expected)
+
+    def test_app_folder(self):
+        """Test the app folder itself being the install."""
+        folders = _utils.get_app_folders_vers(
+            "app", self.tmpdir, test_folder=lambda path: path == self.appdir)
+        self.assertEqual(folders, [self.appdir])
+
+    def test_missing(self):
+        """Test a missing app folder."""
+        self.assertRaises(RezBindError, _utils.get_app_folders_vers,
+                          "missing", self.tmpdir)
+        self.assertRaises(RezBindError, _utils.get_app_folders_vers,
+                          "notadir", self.appdir)
+
+
+if __name__ == '__main__':
+    unittest.main()